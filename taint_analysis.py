@@ -26,6 +26,10 @@ from slither.slithir.variables import Constant, LocalIRVariable, ReferenceVariab
 VariableType = Any
 # 直接依赖映射：变量 -> set(直接影响它的变量)
 DirectDepMap = Dict[VariableType, Set[VariableType]]
+# 输入变量位图：输入变量 -> 单比特掩码
+InputBits = Dict[VariableType, int]
+# 迭代器耗尽标记（依赖集合中可能出现 None，不能用 None 作标记）
+_DONE = object()
 
 def non_ssa(v: VariableType) -> VariableType:
     """返回变量的非 SSA 版本（若存在），否则返回自身"""
@@ -40,7 +44,10 @@ def compute_direct_dependencies(slither: Slither, target_contract_name: str) ->
     对于每个 IR 操作（OperationWithLValue），记录左值直接依赖 IR 中读取的变量（排除常量）。
     返回的映射中的边均为直接依赖边。
     """
-    direct_dep: DirectDepMap = defaultdict(set)
+    # 构造阶段先用列表累积依赖（避免逐次哈希），遍历结束后统一转换为集合
+    pending: Dict[VariableType, List[VariableType]] = defaultdict(list)
+    # SSA 变量 -> 非 SSA 版本的缓存，同一变量会被大量 IR 重复读取
+    non_ssa_cache: Dict[VariableType, VariableType] = {}
     
     # 查找目标合约
     target_contract: Contract = None
@@ -56,30 +63,113 @@ def compute_direct_dependencies(slither: Slither, target_contract_name: str) ->
     for function in target_contract.functions + list(target_contract.modifiers):
         for node in function.nodes:
             for ir in node.irs_ssa:
-                if isinstance(ir, OperationWithLValue) and ir.lvalue:
-                    # 过滤 storage 类型的 IR（例如直接存储的 state variable），根据需要可调整
-                    if hasattr(ir.lvalue, "is_storage") and ir.lvalue.is_storage:
+                if not isinstance(ir, OperationWithLValue):
+                    continue
+                lval = ir.lvalue
+                if not lval:
+                    continue
+                # 过滤 storage 类型的 IR（例如直接存储的 state variable），根据需要可调整
+                if getattr(lval, "is_storage", False):
+                    continue
+                pts = getattr(lval, "points_to", None)
+                if pts:
+                    lval = pts
+                lval = non_ssa(lval)
+                
+                # 根据 IR 类型获取读取的变量列表
+                if isinstance(ir, Index):
+                    reads = [ir.variable_left]
+                elif isinstance(ir, InternalCall) and ir.function:
+                    reads = ir.function.return_values_ssa
+                else:
+                    reads = ir.read
+                # 遇到第一个非常量读取时才创建条目，保持左值按首次依赖出现的顺序排列
+                deps = None
+                for r in reads:
+                    if isinstance(r, Constant):
                         continue
-                    lval = ir.lvalue
-                    if hasattr(lval, "points_to"):
-                        pts = lval.points_to
-                        if pts:
-                            lval = pts
-                    lval = non_ssa(lval)
-                    
-                    # 根据 IR 类型获取读取的变量列表
-                    if isinstance(ir, Index):
-                        reads = [ir.variable_left]
-                    elif isinstance(ir, InternalCall) and ir.function:
-                        reads = ir.function.return_values_ssa
-                    else:
-                        reads = ir.read
-                    for r in reads:
-                        if isinstance(r, Constant):
-                            continue
-                        direct_dep[lval].add(non_ssa(r))
+                    dep = non_ssa_cache.get(r)
+                    if dep is None:
+                        dep = non_ssa_cache[r] = non_ssa(r)
+                    if deps is None:
+                        deps = pending[lval]
+                    deps.append(dep)
+    
+    # 转换为集合去重
+    direct_dep: DirectDepMap = {lval: set(deps) for lval, deps in pending.items()}
     return direct_dep
 
+def input_bitmasks(input_set: Set[VariableType]) -> InputBits:
+    """为每个输入变量分配一个比特位，返回 输入变量 -> 单比特掩码"""
+    return {v: 1 << i for i, v in enumerate(input_set)}
+
+def compute_reachable_inputs(
+    target: VariableType,
+    direct_dep: DirectDepMap,
+    input_bits: InputBits
+) -> Dict[VariableType, int]:
+    """
+    计算从目标变量沿直接依赖"逆向"可到达的输入变量集合。
+    使用迭代版 Tarjan 算法将环收缩为强连通分量（SCC）；Tarjan 按逆拓扑序产出 SCC，
+    因此某个 SCC 完成时，其后继 SCC 的可达集合均已计算完毕，只需做一次并集传播，整体 O(V+E)。
+    可达集合以整数位图表示（比特位由 input_bitmasks 分配），并集即按位或。
+    与 find_dependency_paths 一致，输入变量视为终点，不再向前展开。
+    返回的映射覆盖所有从目标可达的变量：变量 -> 可达输入变量的位图。
+    """
+    def successors(v: VariableType):
+        if v in input_bits:
+            return ()
+        return direct_dep.get(v, ())
+
+    index: Dict[VariableType, int] = {target: 0}
+    lowlink: Dict[VariableType, int] = {target: 0}
+    scc_stack: List[VariableType] = [target]
+    on_stack: Set[VariableType] = {target}
+    reach: Dict[VariableType, int] = {}
+    # 显式栈代替递归：每一项为 (变量, 其前驱迭代器)
+    work = [(target, iter(successors(target)))]
+    while work:
+        v, it = work[-1]
+        descended = False
+        for w in it:
+            if w not in index:
+                index[w] = lowlink[w] = len(index)
+                scc_stack.append(w)
+                on_stack.add(w)
+                work.append((w, iter(successors(w))))
+                descended = True
+                break
+            if w in on_stack:
+                lowlink[v] = min(lowlink[v], index[w])
+        if descended:
+            continue
+
+        work.pop()
+        if work:
+            parent = work[-1][0]
+            lowlink[parent] = min(lowlink[parent], lowlink[v])
+        if lowlink[v] != index[v]:
+            continue
+
+        # v 为 SCC 的根：弹出整个分量并合并其可达输入
+        component = []
+        while True:
+            w = scc_stack.pop()
+            on_stack.discard(w)
+            component.append(w)
+            if w is v:
+                break
+        members = set(component)
+        mask = 0
+        for w in component:
+            mask |= input_bits.get(w, 0)
+            for precursor in successors(w):
+                if precursor not in members:
+                    mask |= reach[precursor]
+        for w in component:
+            reach[w] = mask
+    return reach
+
 def find_dependency_paths(
     target: VariableType,
     direct_dep: DirectDepMap,
@@ -87,25 +177,35 @@ def find_dependency_paths(
 ) -> List[List[VariableType]]:
     """
     从目标变量沿直接依赖"逆向"查找路径，直到遇到输入变量。
-    DFS 遍历：若当前变量在 input_set 中，则视为路径终止，返回一条路径。
+    DFS 遍历（显式栈）：若当前变量在 input_set 中，则视为路径终止，返回一条路径。
+    先通过 compute_reachable_inputs 剪枝，无法到达任何输入变量的分支不再展开。
     返回的每条路径为从输入到目标的顺序列表。
     """
-    def dfs(current: VariableType, visited: Set[VariableType]) -> List[List[VariableType]]:
-        # 若当前变量已为输入变量，则返回该路径（以列表形式）
-        if current in input_set:
-            return [[current]]
-        if current not in direct_dep:
-            return []  # 无依赖关系则终止
-        paths = []
-        for precursor in direct_dep[current]:
-            if precursor in visited:
-                continue
-            subpaths = dfs(precursor, visited | {precursor})
-            for sp in subpaths:
-                paths.append(sp + [current])
-        return paths
+    if target in input_set:
+        return [[target]]
+    reach = compute_reachable_inputs(target, direct_dep, input_bitmasks(input_set))
+    if not reach[target]:
+        return []
 
-    return dfs(target, {target})
+    paths = []
+    path = [target]  # 当前逆向路径（目标 -> 当前变量）
+    visited = {target}
+    stack = [iter(direct_dep.get(target, ()))]
+    while stack:
+        precursor = next(stack[-1], _DONE)
+        if precursor is _DONE:
+            stack.pop()
+            visited.discard(path.pop())
+            continue
+        if precursor in visited or not reach.get(precursor):
+            continue
+        if precursor in input_set:
+            paths.append([precursor] + path[::-1])
+            continue
+        path.append(precursor)
+        visited.add(precursor)
+        stack.append(iter(direct_dep[precursor]))
+    return paths
 
 def main():
     if len(sys.argv) != 4:
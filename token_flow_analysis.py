@@ -6,10 +6,83 @@ from slither.core.declarations import Function, Contract
 from slither.core.variables.state_variable import StateVariable
 from slither.core.variables.local_variable import LocalVariable
 from slither.core.expressions import Identifier
+from slither.slithir.operations import OperationWithLValue
 
+import json
+import re
 import sys
 import os
-from typing import Dict, Optional, List
+from collections import defaultdict
+from contextlib import nullcontext, redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import chain
+from typing import Any, Dict, Optional, List, NamedTuple, Tuple
+
+try:
+    import orjson
+except ImportError:  # optional: fall back to the standard library encoder
+    orjson = None
+
+# Solidity identifier tokens of an expression string (identifiers may contain `$`)
+_IDENTIFIER_RE = re.compile(r'[A-Za-z_$][\w$]*')
+
+# A state variable write: (writing function, expression, its parameters named in the expression)
+StateWrite = Tuple[Function, str, Tuple[LocalVariable, ...]]
+
+
+class InputRecord(NamedTuple):
+    """An input parameter or local variable carrying the amount"""
+    name: str
+    type: str
+    value: Optional[str] = None
+
+
+class VariableRecord(NamedTuple):
+    """A state variable or parameter and its type"""
+    name: str
+    type: str
+
+
+class ModificationRecord(NamedTuple):
+    """A state variable write: the writing function and its expression"""
+    function: str
+    expression: str
+
+
+class CrossFunctionInput(NamedTuple):
+    """A write in another function and the parameters it uses"""
+    function: str
+    expression: str
+    parameters: List[VariableRecord]
+
+
+def to_plain(value: Any) -> Any:
+    """
+    Convert analysis results into plain dicts and lists, e.g. for JSON output.
+    Record fields that are None (an input without a value) are left out.
+    """
+    if isinstance(value, tuple) and hasattr(value, "_asdict"):
+        return {k: to_plain(v) for k, v in value._asdict().items() if v is not None}
+    if isinstance(value, dict):
+        return {k: to_plain(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [to_plain(v) for v in value]
+    return value
+
+
+@dataclass
+class ContractIndex:
+    """
+    Contract-wide lookups shared by every analysis of the same contract
+    """
+    # Functions by name; the first definition wins, as in a linear scan
+    fn_by_name: Dict[str, Function]
+    # State variables by name and their declaration order; the first declaration wins
+    state_by_name: Dict[str, StateVariable]
+    state_order: Dict[str, int]
+    # State variable writes by variable name, in function and node order
+    writes_by_var: Dict[str, List[StateWrite]]
 
 
 class TokenAmountAnalyzer:
@@ -25,16 +98,118 @@ class TokenAmountAnalyzer:
         except Exception as e:
             print(f"Error loading contract: {str(e)}")
             sys.exit(1)
+        
+        self._init_caches()
+    
+    @classmethod
+    def from_slither(cls, slither: Slither) -> "TokenAmountAnalyzer":
+        """
+        Create an analyzer on an already loaded Slither instance, skipping compilation.
+        Library callers that analyze the same project repeatedly should use this;
+        the file-based constructor is meant for one-shot CLI runs.
+        """
+        analyzer = cls.__new__(cls)
+        analyzer.slither = slither
+        analyzer._init_caches()
+        return analyzer
+    
+    def _init_caches(self) -> None:
+        """Set up the lookup caches shared by all analyses of this Slither instance"""
+        # Contract lookups by name, including misses
+        self._contract_cache: Dict[str, Optional[Contract]] = {}
+        # Contract indices keyed by id(contract)
+        self._indices: Dict[int, ContractIndex] = {}
+        # Stringified node expressions keyed by id(node)
+        self._expr_cache: Dict[int, Optional[str]] = {}
+        # Formatted variable types keyed by id(variable)
+        self._type_str_cache: Dict[int, str] = {}
+        # Memoized is_dependent results keyed by (id(var), id(source), id(function))
+        self._dep_cache: Dict[Tuple[int, int, int], bool] = {}
     
     def get_contract(self, contract_name: str) -> Optional[Contract]:
         """Get a contract by name"""
-        contracts = self.slither.get_contract_from_name(contract_name)
-        return contracts[0] if contracts else None
+        if contract_name not in self._contract_cache:
+            contracts = self.slither.get_contract_from_name(contract_name)
+            self._contract_cache[contract_name] = contracts[0] if contracts else None
+        return self._contract_cache[contract_name]
+    
+    def _is_dep(self, var, source, function: Function) -> bool:
+        """Memoized wrapper around Slither's is_dependent"""
+        key = (id(var), id(source), id(function))
+        dependent = self._dep_cache.get(key)
+        if dependent is None:
+            dependent = is_dependent(var, source, function)
+            self._dep_cache[key] = dependent
+        return dependent
+    
+    def _type_str(self, var) -> str:
+        """Format a variable's type once and reuse it"""
+        type_str = self._type_str_cache.get(id(var))
+        if type_str is None:
+            type_str = self._type_str_cache[id(var)] = str(var.type)
+        return type_str
+    
+    def _expr_str(self, node) -> Optional[str]:
+        """Stringify a node's expression once and reuse it; None if the node has none"""
+        key = id(node)
+        if key not in self._expr_cache:
+            expression = getattr(node, 'expression', None)
+            self._expr_cache[key] = str(expression) if expression is not None else None
+        return self._expr_cache[key]
+    
+    @staticmethod
+    def _is_assigned(node, var) -> bool:
+        """Check whether one of the node's SlithIR operations assigns var directly"""
+        return any(isinstance(ir, OperationWithLValue) and ir.lvalue == var for ir in node.irs)
+    
+    def _index(self, contract: Contract) -> ContractIndex:
+        """
+        Build the contract index once per contract: functions and state variables
+        by name, and every state variable write along with the parameters of the
+        writing function used in the expression
+        """
+        index = self._indices.get(id(contract))
+        if index is not None:
+            return index
+        
+        state_by_name = {}
+        for state_var in contract.state_variables:
+            state_by_name.setdefault(state_var.name, state_var)
+        
+        fn_by_name = {}
+        writes_by_var = defaultdict(list)
+        for function in contract.functions:
+            fn_by_name.setdefault(function.name, function)
+            
+            # Unnamed parameters can never appear in an expression
+            parameters = [p for p in function.parameters if p.name]
+            for node in function.nodes:
+                if not node.state_variables_written:
+                    continue
+                expr_str = self._expr_str(node)
+                if expr_str is None:
+                    continue
+                params = ()
+                if parameters:
+                    tokens = set(_IDENTIFIER_RE.findall(expr_str))
+                    params = tuple(p for p in parameters if p.name in tokens)
+                for var in node.state_variables_written:
+                    writes_by_var[var.name].append((function, expr_str, params))
+        
+        index = self._indices[id(contract)] = ContractIndex(
+            fn_by_name=fn_by_name,
+            state_by_name=state_by_name,
+            state_order={name: i for i, name in enumerate(state_by_name)},
+            writes_by_var=dict(writes_by_var)
+        )
+        return index
     
     def analyze_amount_relevant_variables(self, contract: Contract, function_name: str, amount_var: str = "amount") -> Dict:
         """
         Analyze variables relevant to the specified amount variable
         """
+        self._dep_cache.clear()
+        
         result = {
             "function": function_name,
             "target_variable": amount_var,
@@ -43,128 +218,107 @@ class TokenAmountAnalyzer:
             "variable_modifications": {}
         }
         
+        index = self._index(contract)
+        
         # Find the function
-        target_function = None
-        for function in contract.functions:
-            if function.name == function_name:
-                target_function = function
-                break
+        target_function = index.fn_by_name.get(function_name)
         
         if not target_function:
             print(f"Error: Function '{function_name}' not found in contract")
             return result
         
-        # Find input parameters affecting amount
+        # Find input parameters affecting amount; the first match is the amount variable
+        inputs_seen = set()
+        amount_var_obj = None
         for param in target_function.parameters:
             if param.name == amount_var or param.name == f"_{amount_var}":
-                result["inputs"].append({
-                    "name": param.name,
-                    "type": str(param.type)
-                })
+                inputs_seen.add(param.name)
+                result["inputs"].append(InputRecord(param.name, self._type_str(param)))
+                if amount_var_obj is None:
+                    amount_var_obj = param
         
-        # Find local variables derived from parameters or related to amount
+        # Single walk over the target function: stringify each expression once,
+        # find local amount variables, and collect the state variables each node touches
+        node_exprs = []
+        amount_local = None
         for node in target_function.nodes:
+            expr = self._expr_str(node)
+            # Keep the expression only if it mentions the amount variable; the trace scans no others
+            amount_expr = expr if expr and amount_var in expr else None
+            node_exprs.append((node.state_variables_read, node.state_variables_written, amount_expr))
+            
+            # Find local variables derived from parameters or related to amount
             for local_var in node.local_variables_written:
                 if local_var.name == amount_var:
+                    if amount_local is None:
+                        amount_local = local_var
+                    
                     # Found a local variable for the amount
-                    if hasattr(node, 'expression'):
-                        expr = str(node.expression)
-                        if "=" in expr and local_var.name in expr.split("=")[0]:
-                            right_side = expr.split("=")[1].strip()
-                            
-                            if not any(i["name"] == local_var.name for i in result["inputs"]):
-                                result["inputs"].append({
-                                    "name": local_var.name,
-                                    "type": str(local_var.type),
-                                    "value": right_side
-                                })
+                    if (local_var.name not in inputs_seen and expr is not None and
+                        self._is_assigned(node, local_var)):
+                        
+                        _, sep, right_side = expr.partition("=")
+                        if sep:
+                            inputs_seen.add(local_var.name)
+                            result["inputs"].append(
+                                InputRecord(local_var.name, self._type_str(local_var), right_side.strip())
+                            )
         
         # Find the amount variable object (param or local)
-        amount_var_obj = None
-        
-        # Try to find the amount variable
-        for param in target_function.parameters:
-            if param.name == amount_var or param.name == f"_{amount_var}":
-                amount_var_obj = param
-                break
-        
-        if not amount_var_obj:
-            for node in target_function.nodes:
-                for local_var in node.local_variables_written:
-                    if local_var.name == amount_var:
-                        amount_var_obj = local_var
-                        break
-                if amount_var_obj:
-                    break
+        if amount_var_obj is None:
+            amount_var_obj = amount_local
         
         # Trace state variables connected to amount
+        state_names = set()
         if amount_var_obj:
-            for node in target_function.nodes:
-                for state_var in node.state_variables_read + node.state_variables_written:
+            checked = set()
+            for reads, writes, amount_expr in node_exprs:
+                for state_var in chain(reads, writes):
+                    # Each state variable needs only one dependency query per analysis
+                    if state_var in checked:
+                        continue
+                    checked.add(state_var)
+                    
                     # Check if state variable is related to amount via data dependency
-                    if (is_dependent(amount_var_obj, state_var, target_function) and 
-                        state_var.name not in [v["name"] for v in result["state_variables"]]):
+                    if (state_var.name not in state_names and
+                        self._is_dep(amount_var_obj, state_var, target_function)):
                         
-                        result["state_variables"].append({
-                            "name": state_var.name,
-                            "type": str(state_var.type)
-                        })
+                        state_names.add(state_var.name)
+                        result["state_variables"].append(
+                            VariableRecord(state_var.name, self._type_str(state_var))
+                        )
                 
                 # Also check expression to find state variables that might be missed by is_dependent
-                if hasattr(node, 'expression') and node.expression:
-                    expr_str = str(node.expression)
-                    if amount_var in expr_str:
-                        for state_var in contract.state_variables:
-                            if state_var.name in expr_str and state_var.name not in [v["name"] for v in result["state_variables"]]:
-                                result["state_variables"].append({
-                                    "name": state_var.name,
-                                    "type": str(state_var.type)
-                                })
+                if amount_expr is not None:
+                    mentioned = index.state_by_name.keys() & _IDENTIFIER_RE.findall(amount_expr)
+                    for name in sorted(mentioned, key=index.state_order.__getitem__):
+                        if name not in state_names:
+                            state_names.add(name)
+                            result["state_variables"].append(
+                                VariableRecord(name, self._type_str(index.state_by_name[name]))
+                            )
         
         # Special case for balances mapping (common in token contracts)
-        balances_found = False
-        for var in result["state_variables"]:
-            if var["name"] == "balances":
-                balances_found = True
-                break
-        
-        if not balances_found:
-            for state_var in contract.state_variables:
-                if state_var.name == "balances":
-                    result["state_variables"].append({
-                        "name": "balances",
-                        "type": str(state_var.type)
-                    })
-                    break
+        balances = index.state_by_name.get("balances")
+        if balances is not None and "balances" not in state_names:
+            state_names.add("balances")
+            result["state_variables"].append(VariableRecord("balances", self._type_str(balances)))
         
         # Find all modifications to these state variables
         for state_var in result["state_variables"]:
-            var_name = state_var["name"]
-            result["variable_modifications"][var_name] = []
+            var_name = state_var.name
+            modifications = index.writes_by_var.get(var_name, [])
             
-            # Check in the target function
-            for node in target_function.nodes:
-                for var in node.state_variables_written:
-                    if var.name == var_name:
-                        if hasattr(node, 'expression'):
-                            result["variable_modifications"][var_name].append({
-                                "function": function_name,
-                                "expression": str(node.expression)
-                            })
-            
-            # Check across other functions
-            for function in contract.functions:
-                if function.name == function_name:
-                    continue  # Skip target function as we already processed it
-                
-                for node in function.nodes:
-                    for var in node.state_variables_written:
-                        if var.name == var_name:
-                            if hasattr(node, 'expression'):
-                                result["variable_modifications"][var_name].append({
-                                    "function": function.name,
-                                    "expression": str(node.expression)
-                                })
+            # Target function first, then the others (skipping overloads of the target)
+            result["variable_modifications"][var_name] = [
+                ModificationRecord(function_name, expr_str)
+                for function, expr_str, _ in modifications
+                if function is target_function
+            ] + [
+                ModificationRecord(function.name, expr_str)
+                for function, expr_str, _ in modifications
+                if function.name != function_name
+            ]
         
         return result
     
@@ -178,68 +332,71 @@ class TokenAmountAnalyzer:
         }
         
         # For each state variable, find functions that modify it and their inputs
+        writes_by_var = self._index(contract).writes_by_var
         for state_var in analysis_result["state_variables"]:
-            var_name = state_var["name"]
+            var_name = state_var.name
             result["state_variable_inputs"][var_name] = []
             
-            # Check each function that modifies this state variable
-            for modification in analysis_result["variable_modifications"].get(var_name, []):
-                modifying_function_name = modification["function"]
-                
+            # Parameter matches were collected together with the writes
+            for modifying_function, expression, params in writes_by_var.get(var_name, []):
                 # Skip the target function
-                if modifying_function_name == analysis_result["function"]:
+                if modifying_function.name == analysis_result["function"]:
                     continue
                 
-                # Find the function
-                modifying_function = None
-                for function in contract.functions:
-                    if function.name == modifying_function_name:
-                        modifying_function = function
-                        break
-                
-                if modifying_function:
-                    # Check inputs of this function
-                    input_params = []
-                    for param in modifying_function.parameters:
-                        if str(param.name) in str(modification["expression"]):
-                            input_params.append({
-                                "name": param.name,
-                                "type": str(param.type)
-                            })
-                    
-                    if input_params:
-                        result["state_variable_inputs"][var_name].append({
-                            "function": modifying_function_name,
-                            "expression": modification["expression"],
-                            "parameters": input_params
-                        })
+                if params:
+                    result["state_variable_inputs"][var_name].append(CrossFunctionInput(
+                        modifying_function.name,
+                        expression,
+                        [VariableRecord(param.name, self._type_str(param)) for param in params]
+                    ))
         
         return result
     
+    @staticmethod
+    def to_json(analysis_result: Dict, cross_function_inputs: Dict) -> bytes:
+        """
+        Serialize analysis results to JSON bytes (using orjson when it is installed)
+        """
+        document = {
+            "analysis": to_plain(analysis_result),
+            "cross_function_inputs": to_plain(cross_function_inputs)
+        }
+        if orjson is not None:
+            return orjson.dumps(document)
+        # Match orjson's compact, unescaped UTF-8 output
+        return json.dumps(document, separators=(",", ":"), ensure_ascii=False).encode()
+    
     def print_analysis_results(self, analysis_result: Dict, cross_function_inputs: Dict) -> None:
         """
-        Print analysis results in a simple format
+        Print analysis results in a simple format.
+        Accepts the records returned by the analysis methods or their to_plain dicts
+        (e.g. from analyze_batch).
         """
-        print("\nAMOUNT VARIABLE ANALYSIS")
-        print("Function:", analysis_result["function"])
-        print("Target Variable:", analysis_result["target_variable"])
+        analysis_result = to_plain(analysis_result)
+        cross_function_inputs = to_plain(cross_function_inputs)
+        
+        # Collect the report and write it to stdout at once
+        out = []
+        out.append("\nAMOUNT VARIABLE ANALYSIS")
+        out.append(f"Function: {analysis_result['function']}")
+        out.append(f"Target Variable: {analysis_result['target_variable']}")
         
         # 1. Print input parameters
-        print("\n1. Input parameters affecting amount:")
+        out.append("\n1. Input parameters affecting amount:")
         if analysis_result["inputs"]:
             for input_var in analysis_result["inputs"]:
-                if "value" in input_var:
-                    print(f"  - {input_var['name']} = {input_var['value']}")
+                if input_var.get("value") is not None:
+                    out.append(f"  - {input_var['name']} = {input_var['value']}")
                 else:
-                    print(f"  - {input_var['name']}")
+                    out.append(f"  - {input_var['name']}")
         else:
-            print("  None found")
+            out.append("  None found")
         
         # 2. Print state variables and relevant code
-        print("\n2. State variables affecting amount:")
+        out.append("\n2. State variables affecting amount:")
         if analysis_result["state_variables"]:
             for var in analysis_result["state_variables"]:
-                print(f"  - {var['name']}")
+                out.append(f"  - {var['name']}")
                 
                 # Show relevant code in the target function
                 relevant_code = [
@@ -248,61 +405,129 @@ class TokenAmountAnalyzer:
                 ]
                 
                 if relevant_code:
-                    print("    Relevant code in current function:")
+                    out.append("    Relevant code in current function:")
                     for code in relevant_code:
-                        print(f"      * {code}")
+                        out.append(f"      * {code}")
         else:
-            print("  None found")
+            out.append("  None found")
         
         # 3. Trace back to inputs in other functions
-        print("\n3. Inputs in other functions affecting these state variables:")
+        out.append("\n3. Inputs in other functions affecting these state variables:")
         has_inputs = False
         
         for var_name, inputs in cross_function_inputs["state_variable_inputs"].items():
             if inputs:
                 has_inputs = True
-                print(f"  State variable: {var_name}")
+                out.append(f"  State variable: {var_name}")
                 
                 for input_info in inputs:
-                    print(f"    Modified in function '{input_info['function']}':")
-                    print(f"      Expression: {input_info['expression']}")
-                    print("      Parameters:")
+                    out.append(f"    Modified in function '{input_info['function']}':")
+                    out.append(f"      Expression: {input_info['expression']}")
+                    out.append("      Parameters:")
                     for param in input_info["parameters"]:
-                        print(f"        - {param['name']}")
+                        out.append(f"        - {param['name']}")
         
         if not has_inputs:
-            print("  None found")
+            out.append("  None found")
+        
+        sys.stdout.write("\n".join(out) + "\n")
 
 
-def main():
-    """Main entry point for the token amount analyzer"""
-    if len(sys.argv) < 4:
-        print("Usage: python amount_analyzer.py <contract_file.sol> <contract_name> <function_name> [amount_variable]")
-        print("Example: python amount_analyzer.py Vault.sol Vault withdraw amount")
-        sys.exit(1)
-    
-    contract_file = sys.argv[1]
-    contract_name = sys.argv[2]
-    function_name = sys.argv[3]
-    amount_var = sys.argv[4] if len(sys.argv) > 4 else "amount"
-    
+# A batch job: (contract_file, contract_name, function_name, amount_variable)
+BatchJob = Tuple[str, str, str, str]
+
+
+def _analyze_file_jobs(contract_file: str, jobs: List[BatchJob]) -> List[Dict]:
+    """
+    Run every job for one contract file in a single worker, so the file is compiled once.
+    The analyzer's progress and error prints go to stderr, keeping the caller's stdout clean
+    """
     if not os.path.isfile(contract_file):
-        print(f"Error: File {contract_file} does not exist")
-        sys.exit(1)
-    
-    analyzer = TokenAmountAnalyzer(contract_file)
-    contract = analyzer.get_contract(contract_name)
+        return [{"error": f"File {contract_file} does not exist"} for _ in jobs]
+    with redirect_stdout(sys.stderr):
+        try:
+            analyzer = TokenAmountAnalyzer(contract_file)
+        except SystemExit:
+            return [{"error": f"Failed to load {contract_file}"} for _ in jobs]
+        
+        results = []
+        for _, contract_name, function_name, amount_var in jobs:
+            contract = analyzer.get_contract(contract_name)
+            if not contract:
+                results.append({"error": f"Contract '{contract_name}' not found in {contract_file}"})
+                continue
+            try:
+                analysis_result = analyzer.analyze_amount_relevant_variables(contract, function_name, amount_var)
+                cross_function_inputs = analyzer.trace_inputs_across_functions(contract, analysis_result)
+            except Exception as e:
+                results.append({"error": f"Analysis of {contract_name}.{function_name} failed: {e}"})
+                continue
+            results.append({
+                "analysis": to_plain(analysis_result),
+                "cross_function_inputs": to_plain(cross_function_inputs)
+            })
+    return results
+
+
+def analyze_batch(jobs: List[BatchJob], max_workers: Optional[int] = None) -> List[Dict]:
+    """
+    Analyze independent jobs in parallel worker processes, one worker task per contract file.
+    Returns one dict per job, in job order, holding either "analysis" and
+    "cross_function_inputs" as plain dicts and lists (see to_plain) or an "error" message.
+    """
+    jobs_by_file: Dict[str, List[Tuple[int, BatchJob]]] = defaultdict(list)
+    for position, job in enumerate(jobs):
+        jobs_by_file[job[0]].append((position, job))
     
-    if not contract:
-        print(f"Error: Contract '{contract_name}' not found in {contract_file}")
-        sys.exit(1)
+    results: List[Optional[Dict]] = [None] * len(jobs)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_analyze_file_jobs, contract_file, [job for _, job in entries]): entries
+            for contract_file, entries in jobs_by_file.items()
+        }
+        for future, entries in futures.items():
+            for (position, _), result in zip(entries, future.result()):
+                results[position] = result
+    return results
+
+
+def main():
+    """Main entry point for the token amount analyzer"""
+    as_json = "--json" in sys.argv[1:]
+    args = [arg for arg in sys.argv[1:] if arg != "--json"]
     
-    # Run the analysis
-    analysis_result = analyzer.analyze_amount_relevant_variables(contract, function_name, amount_var)
-    cross_function_inputs = analyzer.trace_inputs_across_functions(contract, analysis_result)
+    # In JSON mode stdout carries only the JSON document; usage, progress and errors go to stderr
+    with redirect_stdout(sys.stderr) if as_json else nullcontext():
+        if len(args) < 3:
+            print("Usage: python amount_analyzer.py <contract_file.sol> <contract_name> <function_name> [amount_variable] [--json]")
+            print("Example: python amount_analyzer.py Vault.sol Vault withdraw amount")
+            sys.exit(1)
+        
+        contract_file = args[0]
+        contract_name = args[1]
+        function_name = args[2]
+        amount_var = args[3] if len(args) > 3 else "amount"
+        
+        if not os.path.isfile(contract_file):
+            print(f"Error: File {contract_file} does not exist")
+            sys.exit(1)
+        
+        analyzer = TokenAmountAnalyzer(contract_file)
+        contract = analyzer.get_contract(contract_name)
+        
+        if not contract:
+            print(f"Error: Contract '{contract_name}' not found in {contract_file}")
+            sys.exit(1)
+        
+        # Run the analysis
+        analysis_result = analyzer.analyze_amount_relevant_variables(contract, function_name, amount_var)
+        cross_function_inputs = analyzer.trace_inputs_across_functions(contract, analysis_result)
     
     # Print results
-    analyzer.print_analysis_results(analysis_result, cross_function_inputs)
+    if as_json:
+        sys.stdout.buffer.write(analyzer.to_json(analysis_result, cross_function_inputs) + b"\n")
+    else:
+        analyzer.print_analysis_results(analysis_result, cross_function_inputs)
 
 
 if __name__ == "__main__":